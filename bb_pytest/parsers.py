@@ -0,0 +1,349 @@
+#
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parsers for the per-test progress lines pytest prints while running.
+
+Each output format (verbose, xdist, dots, ...) has its own small parser
+class, registered under a name with L{register_parser}.  The step picks
+one parser per run, either by name or by looking at the session header
+with L{detect_parser}, so every line is only matched against the
+patterns of the format actually in use.
+"""
+
+import re
+
+
+# map the status words and letters pytest prints to outcome names
+STATUSES = {
+    "PASSED": "passed",
+    "FAILED": "failed",
+    "SKIPPED": "skipped",
+    "ERROR": "error",
+    "XFAIL": "xfailed",
+    "XPASS": "xpassed",
+    "xfail": "xfailed",
+    "xpass": "xpassed",
+    }
+
+
+def addMarks(result, marks, line, testname=None):
+    """
+    Add a test to C{result} for every character of C{line}, which is
+    made of the keys of C{marks}.
+    """
+    for mark, status in marks.items():
+        count = line.count(mark)
+        if count:
+            result.addTest(status, count=count)
+    if line and testname is not None:
+        result.lastTest = testname
+
+
+class ParseResult(object):
+    """
+    What a parser has found out so far about the tests run.
+    """
+
+    def __init__(self):
+        self.numTests = 0
+        self.lastTest = None
+        # number of tests per outcome, keyed by the values of STATUSES
+        self.outcomes = {}
+        # the progress pytest reported itself, if it does
+        self.percent = None
+
+    def addTest(self, status, testname=None, count=1):
+        self.numTests += count
+        self.outcomes[status] = self.outcomes.get(status, 0) + count
+        if testname is not None:
+            self.lastTest = testname
+
+    def setPercent(self, percent):
+        if percent is not None:
+            self.percent = int(percent)
+
+
+class OutputParser(object):
+    """
+    Base class for output parsers.
+
+    Subclasses implement L{feed} for a single line (without the line
+    ending) and may override L{detect} to be picked automatically.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.result = ParseResult()
+        self._partial = ""
+
+    @classmethod
+    def detect(cls, header):
+        """
+        @type  header: list of strings
+        @param header: the lines pytest printed before running the first
+                       test.
+        @return: True if this parser understands the output that follows.
+        """
+        return False
+
+    def feed(self, line):
+        raise NotImplementedError
+
+    def feed_chunk(self, data):
+        """
+        Feed raw output which may start or end in the middle of a line.
+        """
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.feed(line)
+
+
+class PytestParser(OutputParser):
+    """
+    Verbose (-v) output, one line per test::
+
+        fixture.py::test_test4 PASSED                   [ 44%]
+        fixture.py::test_test5 SKIPPED (no network)     [ 55%]
+        fixture.py:28: test_test4 PASSED
+    """
+
+    name = "pytest"
+
+    RE_LINE = re.compile(r"^(?P<testname>\S+::\S.*?) (?P<status>[A-Z]+)(?: \(.*\))?(?: +\[ *(?P<percent>\d+)%\])?$")
+    RE_LINE_OLD = re.compile(r"^(?P<path>.+):\d+: (?P<testname>.+) (?P<status>[A-Za-z]+)$")
+
+    @classmethod
+    def detect(cls, header):
+        return any(line.startswith("collecting ") for line in header)
+
+    def feed(self, line):
+        line = line.rstrip()
+        m = self.RE_LINE.match(line)
+        if m:
+            self.result.setPercent(m.group("percent"))
+        else:
+            m = self.RE_LINE_OLD.match(line)
+        if m and m.group("status") in STATUSES:
+            self.result.addTest(STATUSES[m.group("status")], m.group("testname"))
+
+
+class DotsParser(OutputParser):
+    """
+    Default and quiet (-q) output, one character per test::
+
+        fixture.py .F.s.s.FF                            [100%]
+
+    Long runs wrap onto lines of bare characters.
+    """
+
+    name = "dots"
+
+    MARKS = {
+        ".": "passed",
+        "F": "failed",
+        "E": "error",
+        "s": "skipped",
+        "x": "xfailed",
+        "X": "xpassed",
+        }
+    RE_LINE = re.compile(r"^(?:(?P<path>\S+) )?(?P<marks>[.FEsxX]+) *(?:\[ *(?P<percent>\d+)%\])?$")
+
+    @classmethod
+    def detect(cls, header):
+        return any(line.startswith("collected ") for line in header)
+
+    def feed(self, line):
+        m = self.RE_LINE.match(line.rstrip())
+        if m:
+            addMarks(self.result, self.MARKS, m.group("marks"), m.group("path"))
+            self.result.setPercent(m.group("percent"))
+
+
+class XdistParser(DotsParser):
+    """
+    pytest-xdist output, reported by the worker which ran each test::
+
+        [gw1] [ 44%] PASSED fixture.py::test_test4
+        [gw1] PASSED fixture.py:28: test_test4
+
+    Without -v xdist prints bare dots, which are counted as such.
+    """
+
+    name = "xdist"
+
+    RE_WORKER_LINE = re.compile(r"^\[gw\d+\] (?:\[ *(?P<percent>\d+)%\] )?(?P<status>[A-Za-z]+) (?P<testname>.+)$")
+    RE_WORKERS = re.compile(r"^(gw\d+ |\[gw\d+\] |created: \d+/\d+ workers|\d+ workers? \[)")
+
+    @classmethod
+    def detect(cls, header):
+        return any(cls.RE_WORKERS.match(line) for line in header)
+
+    def feed(self, line):
+        line = line.rstrip()
+        if line.startswith("[gw"):
+            m = self.RE_WORKER_LINE.match(line)
+            if m and m.group("status") in STATUSES:
+                self.result.addTest(STATUSES[m.group("status")], m.group("testname"))
+                self.result.setPercent(m.group("percent"))
+        else:
+            DotsParser.feed(self, line)
+
+
+class SummaryParser(OutputParser):
+    """
+    The short test summary printed with -rA, one line per test except
+    for skips, which are grouped by reason::
+
+        PASSED fixture.py::test_test1
+        FAILED fixture.py::test_failure1 - assert False
+        SKIPPED [2] fixture.py:18: unconditional skip
+
+    This is never detected automatically as the header does not show it.
+    """
+
+    name = "summary"
+
+    RE_LINE = re.compile(r"^(?P<status>PASSED|FAILED|ERROR|XFAIL|XPASS) (?P<testname>\S+)")
+    RE_SKIPPED = re.compile(r"^SKIPPED \[(?P<count>\d+)\] (?P<location>.+?:\d+):")
+
+    def feed(self, line):
+        m = self.RE_LINE.match(line)
+        if m:
+            self.result.addTest(STATUSES[m.group("status")], m.group("testname"))
+            return
+        m = self.RE_SKIPPED.match(line)
+        if m:
+            self.result.addTest("skipped", m.group("location"), count=int(m.group("count")))
+
+
+class SugarParser(OutputParser):
+    """
+    pytest-sugar output, which redraws the line of a file as its tests
+    finish::
+
+         fixture.py ✓⨯✓s                            44% ████▌
+    """
+
+    name = "sugar"
+
+    MARKS = {
+        "✓": "passed",
+        "⨯": "failed",
+        "ₓ": "error",
+        "s": "skipped",
+        "x": "xfailed",
+        "X": "xpassed",
+        }
+    RE_LINE = re.compile(r"^ *(?P<path>\S+) (?P<marks>[✓⨯ₓsxX]+)(?: +(?P<percent>\d+)%.*)?$")
+    RE_ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+    def __init__(self):
+        OutputParser.__init__(self)
+        self._seen = {}
+
+    @classmethod
+    def detect(cls, header):
+        return any(line.startswith("plugins:") and "sugar" in line or
+                   "pytest-sugar" in line for line in header)
+
+    def feed(self, line):
+        # only the last redraw of a line matters
+        line = self.RE_ANSI.sub("", line.split("\r")[-1]).rstrip()
+        m = self.RE_LINE.match(line)
+        if m:
+            path, marks = m.group("path", "marks")
+            seen = self._seen.get(path, 0)
+            if len(marks) < seen:
+                seen = 0
+            self._seen[path] = len(marks)
+            addMarks(self.result, self.MARKS, marks[seen:], path)
+            self.result.setPercent(m.group("percent"))
+
+
+class TicksParser(OutputParser):
+    """
+    Output of the L{bb_pytest.plugin} log volume reduction mode, where
+    passing tests are not printed and the worker reports the count of
+    every outcome so far in regular ticks::
+
+        ##bb-pytest tick passed=998 failed=2 skipped=0 error=0 xfailed=0 xpassed=0
+    """
+
+    name = "ticks"
+
+    RE_COUNT = re.compile(r"(?P<outcome>\w+)=(?P<count>\d+)")
+
+    @classmethod
+    def detect(cls, header):
+        return any(line.startswith("bb-pytest: ticks") for line in header)
+
+    def feed(self, line):
+        if not line.startswith("##bb-pytest tick "):
+            return
+        outcomes = dict((outcome, int(count))
+                        for outcome, count in self.RE_COUNT.findall(line))
+        self.result.outcomes = outcomes
+        self.result.numTests = sum(outcomes.values())
+
+
+PARSERS = {}
+_detectOrder = []
+
+
+def register_parser(name, parserClass):
+    """
+    Make C{parserClass} available as pytestMode C{name}.
+
+    Parsers registered later are tried first by L{detect_parser}, so a
+    project's own parser takes precedence over the built-in ones.
+    """
+    PARSERS[name] = parserClass
+    if name in _detectOrder:
+        _detectOrder.remove(name)
+    _detectOrder.insert(0, name)
+
+
+def get_parser(name):
+    """
+    @return: a new instance of the parser registered as C{name}.
+    """
+    try:
+        return PARSERS[name]()
+    except KeyError:
+        raise ValueError("unknown pytestMode %r" % (name,))
+
+
+def detect_parser(header, default="pytest"):
+    """
+    @type  header: list of strings
+    @param header: the lines pytest printed before running the first test.
+    @return: the name of the first registered parser which recognises the
+             header, or C{default}.
+    """
+    for name in _detectOrder:
+        if PARSERS[name].detect(header):
+            return name
+    return default
+
+
+for _parser in [DotsParser, PytestParser, XdistParser, SummaryParser, SugarParser,
+                TicksParser]:
+    register_parser(_parser.name, _parser)
+del _parser
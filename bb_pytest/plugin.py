@@ -0,0 +1,130 @@
+#
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+pytest plugin run on the worker to cut down the stdio log of big suites.
+
+Loaded with C{-p bb_pytest.plugin}.  With C{--bb-ticks=N} passing tests
+are no longer printed, instead a tick with the count of every outcome is
+printed each N tests::
+
+    ##bb-pytest tick passed=998 failed=2 skipped=0 error=0 xfailed=0 xpassed=0
+
+Failures, errors and the final summary are printed as usual.  With
+C{--bb-full-log=PATH} the verbose report of every test, including the
+tracebacks, is written to the gzip file PATH instead.
+"""
+
+import gzip
+
+import pytest
+
+
+TICK_PREFIX = "##bb-pytest tick"
+HEADER_PREFIX = "bb-pytest:"
+OUTCOMES = ("passed", "failed", "skipped", "error", "xfailed", "xpassed")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bb-pytest", "buildbot log volume reduction")
+    group.addoption("--bb-ticks", type=int, default=0, metavar="N",
+                    dest="bb_ticks",
+                    help="hide passing tests and print a tick every N tests.")
+    group.addoption("--bb-full-log", default=None, metavar="PATH",
+                    dest="bb_full_log",
+                    help="write the report of every test to the gzip file PATH.")
+
+
+def pytest_configure(config):
+    if hasattr(config, "workerinput") or hasattr(config, "slaveinput"):
+        # xdist workers report back to the controller, which does the work
+        return
+    interval = config.getoption("bb_ticks")
+    fullLog = config.getoption("bb_full_log")
+    if interval or fullLog:
+        config.pluginmanager.register(TickReporter(config, interval, fullLog),
+                                      "bb-pytest-ticks")
+
+
+def reportOutcome(report):
+    """
+    @return: the outcome of the test C{report} is about, or None if the
+             report does not decide it.
+    """
+    wasxfail = hasattr(report, "wasxfail")
+    if report.when == "call":
+        if wasxfail:
+            return "xpassed" if report.passed else "xfailed"
+        return report.outcome
+    if report.failed:
+        return "error"
+    if report.skipped and report.when == "setup":
+        return "xfailed" if wasxfail else "skipped"
+    return None
+
+
+class TickReporter(object):
+
+    def __init__(self, config, interval, fullLog):
+        self.config = config
+        self.interval = interval
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.numTests = 0
+        self._lastTick = 0
+        self.fullLog = None
+        if fullLog:
+            self.fullLog = gzip.open(fullLog, "wt")
+
+    def pytest_report_header(self, config):
+        if self.interval:
+            return "%s ticks every %d tests" % (HEADER_PREFIX, self.interval)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_report_teststatus(self, report, config):
+        if (self.interval and report.when == "call" and report.passed and
+                not hasattr(report, "wasxfail")):
+            # the terminal reporter prints nothing for an empty letter and word
+            return "passed", "", ""
+
+    def pytest_runtest_logreport(self, report):
+        outcome = reportOutcome(report)
+        if outcome is None:
+            return
+        self.outcomes[outcome] += 1
+        self.numTests += 1
+        if self.fullLog is not None:
+            self.fullLog.write("%s %s\n" % (report.nodeid, outcome.upper()))
+            if report.failed:
+                self.fullLog.write(report.longreprtext + "\n")
+        if self.interval and self.numTests % self.interval == 0:
+            self.tick()
+
+    def tick(self):
+        reporter = self.config.pluginmanager.getplugin("terminalreporter")
+        if reporter is None or self._lastTick == self.numTests:
+            return
+        self._lastTick = self.numTests
+        reporter.write_line("%s %s" % (TICK_PREFIX, " ".join(
+            "%s=%d" % (outcome, self.outcomes[outcome]) for outcome in OUTCOMES)))
+
+    def pytest_sessionfinish(self, session):
+        # runs before the terminal reporter writes its summary
+        if self.interval:
+            self.tick()
+        if self.fullLog is not None:
+            self.fullLog.close()
+            self.fullLog = None
@@ -0,0 +1,185 @@
+#
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Splitting of the FAILURES and ERRORS sections of pytest into one record
+per test, and grouping of the records by where and how they failed.
+
+Only a small L{FailureSummary} of every failure is kept, the traceback
+lines of a record are handed over once it is complete and then dropped.
+"""
+
+import re
+from collections import OrderedDict
+
+
+RE_SECTION = re.compile(r"^=+ (?P<section>.+?) =+$")
+RE_HEADER = re.compile(r"^_{2,} (?P<testname>.+?) _{2,}$")
+# the records of the ERRORS section say when the test went wrong
+RE_ERROR_PREFIX = re.compile(r"^ERROR (?:at (?:setup|teardown) of|collecting) ")
+# fixture.py:9: AssertionError, the last one is where the test failed
+RE_LOCATION = re.compile(r"^(?P<location>\S+:\d+): (?P<exception>[A-Za-z_][\w.]*)$")
+# fixture.py:9: in test_failure1, as printed with --tb=short
+RE_LOCATION_SHORT = re.compile(r"^(?P<location>\S+:\d+): in ")
+RE_EXCEPTION = re.compile(r"^E\s+(?P<exception>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))\b")
+
+
+class FailureSummary(object):
+    """
+    The test name, exception type and location of one failure.
+    """
+
+    __slots__ = ("testname", "exception", "location")
+
+    def __init__(self, testname, exception=None, location=None):
+        self.testname = testname
+        self.exception = exception
+        self.location = location
+
+    @property
+    def signature(self):
+        """
+        Failures with the same signature are assumed to have the same
+        cause, like C{fixture.py:9: AssertionError}.
+        """
+        if self.location is None and self.exception is None:
+            return self.testname
+        return "%s: %s" % (self.location or "?", self.exception or "?")
+
+
+class FailureSplitter(object):
+    """
+    Splits the lines of the FAILURES and ERRORS sections into records.
+
+    L{feed} returns a (L{FailureSummary}, list of lines) tuple every time
+    a record is complete, which is when the next one starts or a section
+    ends.  Records of other sections, like the PASSES of C{-rA}, are
+    skipped.
+    """
+
+    SECTIONS = ("FAILURES", "ERRORS")
+
+    def __init__(self):
+        self._summary = None
+        self._lines = []
+        self._shortLocation = None
+        self._splitting = False
+
+    def feed(self, line):
+        m = RE_SECTION.match(line)
+        if m:
+            self._splitting = m.group("section") in self.SECTIONS
+            return self.close()
+        if not self._splitting:
+            return None
+        m = RE_HEADER.match(line)
+        if m:
+            record = self.close()
+            self._summary = FailureSummary(RE_ERROR_PREFIX.sub("", m.group("testname")))
+            self._lines = [line]
+            return record
+        if self._summary is None:
+            return None
+        self._lines.append(line)
+        m = RE_LOCATION.match(line)
+        if m:
+            self._summary.location, self._summary.exception = m.group("location", "exception")
+            return None
+        m = RE_LOCATION_SHORT.match(line)
+        if m:
+            self._shortLocation = m.group("location")
+            return None
+        m = RE_EXCEPTION.match(line)
+        if m and self._summary.exception is None:
+            self._summary.exception = m.group("exception")
+        return None
+
+    def close(self):
+        """
+        @return: the record being split, if any, as if it was complete.
+        """
+        if self._summary is None:
+            return None
+        summary, lines = self._summary, self._lines
+        if summary.location is None:
+            summary.location = self._shortLocation
+        self._summary, self._lines, self._shortLocation = None, [], None
+        return summary, lines
+
+
+class FailureGroup(object):
+
+    __slots__ = ("number", "signature", "testnames")
+
+    def __init__(self, number, signature):
+        self.number = number
+        self.signature = signature
+        self.testnames = []
+
+
+class FailureGroups(object):
+    """
+    The failures of a run, grouped by signature in the order in which each
+    signature was first seen.
+    """
+
+    def __init__(self):
+        self._groups = OrderedDict()
+        self.numFailures = 0
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __iter__(self):
+        return iter(self._groups.values())
+
+    def add(self, summary):
+        """
+        @return: the L{FailureGroup} of C{summary}, and True if it is the
+                 first failure of that group.
+        """
+        self.numFailures += 1
+        group = self._groups.get(summary.signature)
+        isNew = group is None
+        if isNew:
+            group = FailureGroup(len(self._groups) + 1, summary.signature)
+            self._groups[summary.signature] = group
+        group.testnames.append(summary.testname)
+        return group, isNew
+
+
+def formatGroups(groups, maxNames=10, logName=None):
+    """
+    Render C{groups} as text, biggest group first.
+
+    @param maxNames: list at most this many test names per group.
+    @param logName: a function returning the name of the log holding the
+                    traceback of a group, or None if there is none.
+    """
+    lines = ["%d %s in %d %s" % (
+        groups.numFailures, groups.numFailures == 1 and "failure" or "failures",
+        len(groups), len(groups) == 1 and "group" or "groups")]
+    for group in sorted(groups, key=lambda group: (-len(group.testnames), group.number)):
+        name = logName and logName(group)
+        lines.append("")
+        lines.append("%d x %s%s" % (len(group.testnames), group.signature,
+                                    name and " (log: %s)" % name or ""))
+        for testname in group.testnames[:maxNames]:
+            lines.append("    %s" % testname)
+        if len(group.testnames) > maxNames:
+            lines.append("    ... and %d more" % (len(group.testnames) - maxNames))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,225 @@
+#
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Re-evaluate saved stdio logs of the Pytest step without a master.
+
+    bb-pytest-replay [--jobs N] [--mode MODE] LOG_OR_DIRECTORY...
+
+Every log is streamed through the same observer and final description
+logic the step uses, and one JSON object per log is written to stdout.
+Logs ending in .gz are decompressed on the fly.
+"""
+
+import argparse
+import fnmatch
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import sys
+
+from twisted.internet import defer
+
+from buildbot.process import results
+
+from bb_pytest.step import HEADER_LINES
+from bb_pytest.step import Pytest
+
+
+RE_EXIT_CODE = re.compile(r"^program finished with exit code (-?\d+)")
+
+
+class NullLog(object):
+
+    def addStdout(self, text):
+        return defer.succeed(None)
+
+    def finish(self):
+        return defer.succeed(None)
+
+
+class ReplayedPytest(Pytest):
+    """
+    A Pytest step which is fed a saved log instead of being run.
+    """
+
+    # there is no master to send the summary and logs to
+
+    def updateSummary(self):
+        pass
+
+    def addLog(self, name, type='s', logEncoding=None):
+        return defer.succeed(NullLog())
+
+    def addCompleteLog(self, name, text):
+        return defer.succeed(None)
+
+
+class ReplayedCommand(object):
+
+    def __init__(self, rc):
+        self.rc = rc
+
+    def results(self):
+        return results.SUCCESS if self.rc == 0 else results.FAILURE
+
+
+def openLog(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", errors="replace")
+    return open(path, errors="replace")
+
+
+def isVerbose(path):
+    """
+    @return: True if the log at C{path} comes from pytest -v.
+    """
+    with openLog(path) as f:
+        for i, line in enumerate(f):
+            if line.startswith("collecting ") or i >= HEADER_LINES:
+                return line.startswith("collecting ")
+    return False
+
+
+def replayLog(path, pytestMode="auto", verbose=None, rc=None):
+    """
+    Feed the log at C{path} to a Pytest step.
+
+    @param verbose: whether the log comes from pytest -v, guessed from its
+                    header if None.
+    @param rc: the exit code of pytest to assume if the log does not
+               record one, guessed from the failures found if None, which
+               are the tests seen to fail if the log has no results line.
+    @return: a dict describing the outcome, as written by L{main}.
+    """
+    if verbose is None:
+        verbose = isVerbose(path)
+    step = ReplayedPytest(tests=[], testpath=None, verbose=verbose,
+                          pytestMode=pytestMode)
+    step.resetResults()
+    observer = step.observer
+    observer.setStep(step)
+
+    logRc = None
+    with openLog(path) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            m = RE_EXIT_CODE.match(line)
+            if m:
+                logRc = int(m.group(1))
+            observer.outLineReceived(line)
+    observer.flushFailures()
+
+    if logRc is not None:
+        rc = logRc
+    parser = observer.parser
+    if rc is None:
+        collected = step.collected_results
+        failed = collected['failures'] or collected['error']
+        if not observer.finished:
+            # without the results line only the tests seen can tell
+            outcomes = parser.result.outcomes if parser is not None else {}
+            failed = (outcomes.get('failed') or outcomes.get('error') or
+                      len(step.failureGroups))
+        rc = 1 if failed else 0
+    cmd = ReplayedCommand(rc)
+
+    return {
+        "log": path,
+        "rc": rc,
+        "result": results.Results[cmd.results()],
+        "description": " ".join(step.finalDescription(cmd)),
+        "results": step.collected_results,
+        "mode": parser.name if parser is not None else None,
+        "numTests": observer.numTests,
+        "outcomes": parser.result.outcomes if parser is not None else {},
+        # where a log which ends early stopped
+        "lastTest": parser.result.lastTest if parser is not None else None,
+        "percent": parser.result.percent if parser is not None else None,
+        "finished": observer.finished,
+        "failureGroups": [{"signature": group.signature,
+                           "count": len(group.testnames),
+                           "tests": group.testnames}
+                          for group in step.failureGroups],
+        }
+
+
+def findLogs(paths, pattern="*"):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                yield os.path.join(dirpath, filename)
+
+
+def _replayOne(args):
+    path, pytestMode, verbose, rc = args
+    try:
+        return replayLog(path, pytestMode, verbose, rc)
+    except Exception as e:
+        return {"log": path, "error": "%s: %s" % (type(e).__name__, e)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="bb-pytest-replay",
+        description="Re-evaluate saved stdio logs of the buildbot Pytest step "
+                    "and write the outcome of each as a line of JSON.")
+    parser.add_argument("paths", nargs="+", metavar="LOG",
+                        help="a saved stdio log, or a directory of them")
+    parser.add_argument("--pattern", default="*",
+                        help="only replay files matching this in directories")
+    parser.add_argument("--mode", default="auto",
+                        help="the pytestMode to parse the logs with (default auto)")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("--verbose", dest="verbose", action="store_true",
+                           default=None, help="the logs come from pytest -v")
+    verbosity.add_argument("--no-verbose", dest="verbose", action="store_false",
+                           help="the logs come from pytest without -v")
+    parser.add_argument("--rc", type=int, default=None,
+                        help="exit code to assume when a log does not record one")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes to replay logs in")
+    args = parser.parse_args(argv)
+
+    work = ((path, args.mode, args.verbose, args.rc)
+            for path in findLogs(args.paths, args.pattern))
+    failed = False
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        outcomes = pool.imap(_replayOne, work, chunksize=16)
+    else:
+        pool = None
+        outcomes = map(_replayOne, work)
+    try:
+        for outcome in outcomes:
+            failed = failed or "error" in outcome
+            sys.stdout.write(json.dumps(outcome, sort_keys=True) + "\n")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Wrapper run on the worker which samples the resource usage of pytest.
+
+    python -m bb_pytest.sampler --interval=1 --output=resources.json -- pytest -v
+
+The output of the command is passed through unchanged, and read to know
+which test is running.  Every interval the CPU, RSS and I/O of the whole
+process tree are read from /proc, and once the command exits a JSON
+report with the samples and the peak RSS seen while each test ran is
+written to the output file.  The exit code is the command's.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+
+COLUMNS = ["time", "cpu", "rss", "read", "write", "test"]
+
+# only lines of finished tests, not "[gw0] linux -- Python 3.8.18 ..."
+RE_WORKER_LINE = re.compile(r"^\[gw\d+\] (?:\[ *\d+%\] )?(?:PASSED|FAILED|SKIPPED|ERROR|XFAIL|XPASS) (?P<testname>\S+)")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def readStat(pid):
+    """
+    @return: (ppid, cpu seconds, rss bytes) of process C{pid}, the CPU time
+             including that of its waited for children.
+    """
+    with open("/proc/%d/stat" % pid) as f:
+        stat = f.read()
+    # the command name may contain spaces, the fields after it do not
+    fields = stat[stat.rindex(")") + 2:].split()
+    ticks = sum(int(fields[i]) for i in range(11, 15))
+    return int(fields[1]), float(ticks) / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+
+
+def readIO(pid):
+    """
+    @return: (read bytes, write bytes) of process C{pid}, zeros if the
+             kernel does not let us see them.
+    """
+    counters = {}
+    try:
+        with open("/proc/%d/io" % pid) as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                counters[name] = int(value)
+    except (IOError, OSError, ValueError):
+        pass
+    return counters.get("read_bytes", 0), counters.get("write_bytes", 0)
+
+
+def processTree(root):
+    """
+    @return: the pids of C{root} and all its descendants.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid = readStat(int(entry))[0]
+        except (IOError, OSError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids = [root]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def sampleTree(root):
+    """
+    @return: (cpu seconds, rss bytes, read bytes, write bytes) summed over
+             the process tree of C{root}.
+    """
+    cpu = rss = read = write = 0
+    for pid in processTree(root):
+        try:
+            _, pidCpu, pidRss = readStat(pid)
+        except (IOError, OSError, ValueError):
+            # exited since we listed it
+            continue
+        pidRead, pidWrite = readIO(pid)
+        cpu += pidCpu
+        rss += pidRss
+        read += pidRead
+        write += pidWrite
+    return cpu, rss, read, write
+
+
+class TestTracker(object):
+    """
+    Follows the output of pytest to tell which test is running.
+
+    In verbose and dots output the current line names the test, or the
+    file, being run before it finishes.  xdist only prints finished tests,
+    the last one of which is used instead.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self.lastTest = None
+
+    def feed_chunk(self, data):
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            m = RE_WORKER_LINE.match(line)
+            if m:
+                self.lastTest = m.group("testname")
+
+    def current(self):
+        token = self._partial.split("\r")[-1].strip().split(" ", 1)[0]
+        if "::" in token or token.endswith(".py"):
+            return token
+        return self.lastTest
+
+
+class Sampler(object):
+
+    def __init__(self, command, interval, output=None):
+        self.command = command
+        self.interval = interval
+        self.output = output or sys.stdout
+        self.tracker = TestTracker()
+        self.samples = []
+        self.peaks = {}
+        self._lock = threading.Lock()
+
+    def _passThrough(self, stream):
+        out = getattr(self.output, "buffer", self.output)
+        while True:
+            data = os.read(stream.fileno(), 65536)
+            if not data:
+                break
+            out.write(data)
+            out.flush()
+            with self._lock:
+                self.tracker.feed_chunk(data.decode("utf-8", "replace"))
+
+    def sample(self, pid, start, last):
+        cpu, rss, read, write = sampleTree(pid)
+        now = time.time()
+        with self._lock:
+            test = self.tracker.current()
+        wall = now - last[0]
+        percent = 100.0 * (cpu - last[1]) / wall if wall > 0 else 0.0
+        self.samples.append([round(now - start, 2), round(max(percent, 0.0), 1),
+                             rss // 1024, read, write, test])
+        if test is not None and rss // 1024 > self.peaks.get(test, 0):
+            self.peaks[test] = rss // 1024
+        return now, cpu
+
+    def run(self):
+        env = dict(os.environ)
+        env.setdefault("PYTHONUNBUFFERED", "1")
+        proc = subprocess.Popen(self.command, stdout=subprocess.PIPE, env=env)
+        reader = threading.Thread(target=self._passThrough, args=(proc.stdout,))
+        reader.daemon = True
+        reader.start()
+        start = time.time()
+        last = (start, 0.0)
+        while proc.poll() is None:
+            try:
+                last = self.sample(proc.pid, start, last)
+            except (IOError, OSError):
+                # the process exited while we read it
+                pass
+            time.sleep(self.interval)
+        reader.join()
+        proc.stdout.close()
+        return proc.returncode
+
+    def report(self):
+        return {
+            "command": self.command,
+            "interval": self.interval,
+            "columns": COLUMNS,
+            "samples": self.samples,
+            "peaks": self.peaks,
+            }
+
+
+def formatSamples(report):
+    """
+    Render the samples of a report as a compact text log, one line per
+    sample.
+    """
+    lines = ["%8s %6s %10s %12s %12s  %s" % ("time", "cpu%", "rss(KiB)",
+                                             "read", "write", "test")]
+    for t, cpu, rss, read, write, test in report["samples"]:
+        lines.append("%8.1f %6.1f %10d %12d %12d  %s" % (t, cpu, rss, read, write,
+                                                          test or ""))
+    return "\n".join(lines) + "\n"
+
+
+def formatPeaks(report, limit=None):
+    """
+    Render the peak RSS per test of a report, highest first.
+    """
+    peaks = sorted(report["peaks"].items(), key=lambda item: (-item[1], item[0]))
+    if limit is not None:
+        peaks = peaks[:limit]
+    return "".join("%10d KiB  %s\n" % (rss, test) for test, rss in peaks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bb_pytest.sampler",
+        description="Run a command and sample the resources its process tree uses.")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between samples (default 1)")
+    parser.add_argument("--output", required=True,
+                        help="file to write the JSON report to")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    command = args.command
+    if command and command[0] == "--":
+        command = command[1:]
+    if not command:
+        parser.error("no command given")
+    sampler = Sampler(command, args.interval)
+    rc = sampler.run()
+    with open(args.output, "w") as f:
+        json.dump(sampler.report(), f, separators=(",", ":"))
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
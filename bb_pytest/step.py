@@ -14,10 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import absolute_import
-from __future__ import print_function
-from future.builtins import range
-
+import json
 import re
 
 from twisted.internet import defer
@@ -32,84 +29,202 @@ from buildbot.process.buildstep import BuildStep
 from buildbot.process.buildstep import ShellMixin
 
 
-RE_LINE_COLLECTING = re.compile(r"^(collecting .*)(collected)(.*)(items)$")
-RE_LINE_COLLECTED = re.compile(r"^(collected)(.*)(items)$")
-RE_LINE_FAILURES = re.compile(r"^=+ FAILURES =+$")
-RE_LINE_RESULTS = re.compile(r"=+ ((?P<failures>\d+) failed|)(,? ?(?P<passed>\d+) passed|)(,? ?(?P<skips>\d+) skipped|)(,? ?(?P<deselected>\d+) deselected|)(,? ?(?P<expectedFailures>\d+) xfailed|)(,? ?(?P<unexpectedSuccesses>\d+) xpassed|)(,? ?(?P<error>\d+) error|) in [\d.]+ seconds =+")
-RE_TEST_MODES = {
-    "pytest": re.compile(r"^(?P<path>.+):\d+: (?P<testname>.+) (?P<status>.+)$"),
-    "xdist": re.compile(r"^\[.+\] (?P<status>.+) (?P<path>.+):\d+: (?P<testname>.+)$")
-    }
+# Line patterns are kept as strings and only compiled when a step is built,
+# so that loading master.cfg does not pay for them.
+RE_LINE_COLLECTING = r"^(collecting .*)(collected)(.*)(items)$"
+RE_LINE_COLLECTED = r"^(collected)(.*)(items)$"
+RE_LINE_FAILURES = r"^=+ (FAILURES|ERRORS) =+$"
+# "in 0.02 seconds" before pytest 5.3, "in 0.02s" or "in 75.02s (0:01:15)" since,
+# without the = around it with -q
+RE_LINE_RESULTS = r"^(?:=+ )?(?=\d)((?P<failures>\d+) failed|)(,? ?(?P<passed>\d+) passed|)(,? ?(?P<skips>\d+) skipped|)(,? ?(?P<deselected>\d+) deselected|)(,? ?(?P<expectedFailures>\d+) xfailed|)(,? ?(?P<unexpectedSuccesses>\d+) xpassed|)(,? ?(?P<warnings>\d+) warnings?|)(,? ?(?P<error>\d+) errors?|) in [\d.]+(?: seconds|s)(?: \([\d:]+\))?(?: =+)?$"
+RE_LINE_SUMMARY = r"^=+ short test summary info =+$"
+# "gw0 [2] / gw1 [2]" before pytest-xdist 2.0, "2 workers [4 items]" since
+RE_LINE_WORKERS = r"^(?:gw\d+|\d+ workers?) \[(\d+)(?: items?)?\]"
+
+# number of lines kept to detect the output format in "auto" mode
+HEADER_LINES = 100
 
 
 class PytestTestCaseCounter(logobserver.LogLineObserver):
 
     def __init__(self, pytestMode):
-        self._line_regexp = RE_TEST_MODES[pytestMode]
+        from bb_pytest import parsers
+        self.mode = pytestMode
+        if pytestMode == "auto":
+            self.parser = None
+            self._header = []
+        else:
+            self.parser = parsers.get_parser(pytestMode)
+            self._header = None
+        self._re_collecting = re.compile(RE_LINE_COLLECTING)
+        self._re_collected = re.compile(RE_LINE_COLLECTED)
+        self._re_workers = re.compile(RE_LINE_WORKERS)
+        self._re_failures = re.compile(RE_LINE_FAILURES)
+        self._re_summary = re.compile(RE_LINE_SUMMARY)
+        self._re_results = re.compile(RE_LINE_RESULTS)
         self.numTests = 0
         self.totalTests = 0
         self.finished = False
         self.collecting = True
         self.testing = False
         self.catching = False
+        self.summarizing = False
+        self.splitter = None
         logobserver.LogLineObserver.__init__(self)
 
+    def _detectMode(self):
+        from bb_pytest import parsers
+        return parsers.detect_parser(self._header,
+                                     default="pytest" if self.step.verbose else "dots")
+
+    def _probe(self, line):
+        """
+        @return: a new parser for this step's mode if it counted C{line} as
+                 a test, else None.
+        """
+        from bb_pytest import parsers
+        parser = parsers.get_parser(self._detectMode() if self.mode == "auto" else self.mode)
+        parser.feed(line)
+        if parser.result.numTests:
+            return parser
+        return None
+
+    def _startTesting(self):
+        if self.parser is None:
+            from bb_pytest import parsers
+            self.parser = parsers.get_parser(self._detectMode())
+            self._header = None
+        self._describeProgress()
+        self.testing = True
+        self.collecting = False
+        self.catching = False
+
+    def _describeProgress(self):
+        result = self.parser.result
+        # build a new list, the step's description may be the class attribute
+        description = [self.step.description[0], str(self.numTests)]
+        if self.totalTests > 0:
+            description.extend(["of", str(self.totalTests), "tests"])
+        else:
+            # the total is unknown, show how far pytest says it got instead
+            description.append("tests")
+            if result.percent is not None:
+                description.append("(%d%%)" % result.percent)
+        failed = result.outcomes.get("failed", 0)
+        if failed:
+            description.append("%d failed" % failed)
+        errors = result.outcomes.get("error", 0)
+        if errors:
+            description.append("%d %s" % (errors, errors == 1 and "error" or "errors"))
+        self.step.description = description
+        self.step.setProgress('tests', self.numTests)
+        self.step.updateSummary()
+
+    def _feedParser(self, line):
+        self.parser.feed(line)
+        if self.parser.result.numTests != self.numTests:
+            self.numTests = self.parser.result.numTests
+            self._describeProgress()
+
+    def _splitFailure(self, line):
+        record = self.splitter.feed(line)
+        if record is not None:
+            self.step.failureReceived(*record)
+
+    def flushFailures(self):
+        """
+        hand the failure being split, if any, over to the step
+        """
+        if self.splitter is not None:
+            record = self.splitter.close()
+            if record is not None:
+                self.step.failureReceived(*record)
+
     def outLineReceived(self, line):
-        # line format
-        # fixture.py:28: test_test4 PASSED
-        # or xdist output
-        # [gw1] PASSED fixture.py:4: test_test
+        # the lines reporting each test are handed to the parser picked
+        # for this step's pytestMode, see bb_pytest.parsers
         if self.finished:
             return
 
         if (not self.testing) and (not self.catching):
+            if self._header is not None and len(self._header) < HEADER_LINES:
+                self._header.append(line)
             if self.step.verbose:
-                m = RE_LINE_COLLECTING.search(line.strip())
+                m = self._re_collecting.search(line.strip())
+                group = 3
             else:
-                m = RE_LINE_COLLECTED.search(line.strip())
+                m = self._re_collected.search(line.strip())
+                group = 2
+            if not m:
+                # xdist reports the number of tests in its own header instead
+                m = self._re_workers.search(line.strip())
+                group = 1
             if m:
                 try:
-                    collected = m.group(3 if self.step.verbose else 2)
-                    self.totalTests = int(collected)
-                    self.step.description.extend(["0", "of", str(self.totalTests), "tests"])
-                    self.step.updateSummary()
-                    self.testing = True
-                    self.collecting = False
-                    self.catching = False
-                except:
+                    self.totalTests = int(m.group(group))
+                except ValueError:
                     self.totalTests = -1
-            return
+                self._startTesting()
+                return
+            # pytest -q prints neither, start with the first test reported
+            # or the first section after the tests, total unknown
+            stripped = line.strip()
+            if self._re_failures.search(stripped) or self._re_results.search(stripped):
+                self.totalTests = -1
+                self._startTesting()
+            else:
+                parser = stripped and self._probe(line)
+                if parser:
+                    self.parser = parser
+                    self._header = None
+                    self.totalTests = -1
+                    self.numTests = parser.result.numTests
+                    self._startTesting()
+                return
 
         # testing mode
         if self.testing and line.startswith("="):
-            m = RE_LINE_FAILURES.search(line.strip())
+            m = self._re_failures.search(line.strip())
             if m:
-                self.step.catched_failures.append(line)
+                from bb_pytest import problems
+                self.splitter = problems.FailureSplitter()
+                self.step.problemLineReceived(line)
+                self._splitFailure(line)
                 self.testing = False
                 self.catching = True
                 return
 
-        if (self.testing or self.catching) and line.startswith("="):
+        if (self.testing or self.catching) and (line.startswith("=") or line[:1].isdigit()):
             # check for final row with summary
-            m = RE_LINE_RESULTS.search(line.strip())
+            m = self._re_results.search(line.strip())
             if m:
+                self.flushFailures()
                 self.step.collected_results.update(dict([(k, 0 if v is None else int(v)) for k, v in m.groupdict().items()]))
-                self.step.collected_results["total"] = self.totalTests
+                if self.totalTests < 0:
+                    self.step.collected_results["total"] = self.numTests
+                else:
+                    self.step.collected_results["total"] = self.totalTests
                 self.step.description = [self.step.description[0], "finished"]
                 self.step.updateSummary()
                 self.finished = True
                 self.testing = False
                 self.catching = False
                 return
- 
+            if self.catching and self._re_summary.search(line.strip()):
+                self.flushFailures()
+                self.summarizing = True
+
         if self.testing and line.strip():
-            self.numTests += 1
-            self.step.description[1] = str(self.numTests)
-            self.step.updateSummary()
+            self._feedParser(line)
             return
-  
+
         if self.catching:
-            self.step.catched_failures.append(line)
+            self.step.problemLineReceived(line)
+            if self.summarizing:
+                # -rA summaries come after the failures
+                self._feedParser(line)
+            else:
+                self._splitFailure(line)
             return
 
 
@@ -127,7 +242,7 @@ class Pytest(BuildStep, ShellMixin):
     description = ["testing"]
     descriptionDone = ["testing", "finished"]
 
-    renderables = ['tests']
+    renderables = ['tests', 'fullLogDest']
     flunkOnFailure = True
     python = None
     pytest = DEFAULT_PYTEST
@@ -137,6 +252,12 @@ class Pytest(BuildStep, ShellMixin):
     testpath = UNSPECIFIED  # required (but can be None)
     testChanges = False  # TODO: needs better name
     tests = None  # required
+    reduceLog = False
+    tickInterval = 100
+    fullLog = "pytest-full.log.gz"
+    fullLogDest = None
+    resourceInterval = None
+    resourceFile = "pytest-resources.json"
 
     collected_results = {
         'total': 0,
@@ -148,12 +269,16 @@ class Pytest(BuildStep, ShellMixin):
         'unexpectedSuccesses': 0,
         }
 
-    catched_failures = []
+    # failure groups which get a log of their own, the rest are only listed
+    # in the failures log
+    maxFailureLogs = 20
 
     def __init__(self, python=None, pytest=None,
                  testpath=UNSPECIFIED,
                  tests=None, testChanges=None, verbose=True,
                  pytestMode=None, pytestArgs=None,
+                 reduceLog=None, tickInterval=None, fullLogDest=None,
+                 resourceInterval=None,
                  **kwargs):
         """
         @type  testpath: string
@@ -178,8 +303,11 @@ class Pytest(BuildStep, ShellMixin):
                       'python2.3 pytest' will not work).
 
         @type pytestMode: string
-        @param pytestMode: a specific test parser to use. Options are pytest
-                          or xdist.  Default pytest.
+        @param pytestMode: a specific test parser to use, one of the names
+                          registered in L{bb_pytest.parsers} (pytest, xdist,
+                          dots, summary, sugar) or auto to pick one from the
+                          session header.  Default pytest, or dots if
+                          verbose is False.
 
         @type pytestArgs: list of strings
         @param pytestArgs: a list of arguments to pass to pytest, available to
@@ -203,6 +331,36 @@ class Pytest(BuildStep, ShellMixin):
                             tags, running just the tests necessary to cover the
                             changes.
 
+        @type  reduceLog: boolean
+        @param reduceLog: if True, load the L{bb_pytest.plugin} pytest plugin
+                          on the worker (bb_pytest must be installed there) so
+                          that passing tests are not sent to the master, only
+                          a progress tick every 'tickInterval' tests and the
+                          details of the tests which did not pass. Implies
+                          verbose=False.
+
+        @type  tickInterval: int
+        @param tickInterval: number of tests between progress ticks when
+                             'reduceLog' is set. Defaults to 100.
+
+        @type  fullLogDest: string
+        @param fullLogDest: with 'reduceLog', have the worker write the
+                            report of every test to a gzip file and upload it
+                            to this path on the master once the tests are
+                            done.
+
+        @type  resourceInterval: float
+        @param resourceInterval: if set, run pytest under L{bb_pytest.sampler}
+                                 on the worker, which samples the CPU, RSS
+                                 and I/O of the pytest processes every this
+                                 many seconds. The samples and the peak
+                                 memory of each test are added as logs.
+                                 The sampler is started with 'python',
+                                 or the 'python' found in $PATH if that
+                                 is not set, which may not be the python
+                                 'pytest' runs with. Either way it needs
+                                 bb_pytest installed.
+
         @type  kwargs: dict
         @param kwargs: parameters. The following parameters are inherited from
                        L{ShellMixin} and may be useful to set: workdir,
@@ -235,6 +393,20 @@ class Pytest(BuildStep, ShellMixin):
             self.pytestArgs = pytestArgs
         if verbose is not None:
             self.verbose = verbose
+        if reduceLog is not None:
+            self.reduceLog = reduceLog
+        if tickInterval is not None:
+            self.tickInterval = tickInterval
+        if fullLogDest is not None:
+            self.fullLogDest = fullLogDest
+        if resourceInterval is not None:
+            self.resourceInterval = resourceInterval
+        if self.reduceLog:
+            self.verbose = False
+            self.pytestMode = "ticks"
+        if not self.verbose and self.pytestMode == "pytest":
+            # without -v pytest prints a character per test
+            self.pytestMode = "dots"
 
         if testpath is not UNSPECIFIED:
             self.testpath = testpath
@@ -252,8 +424,10 @@ class Pytest(BuildStep, ShellMixin):
         if not self.testChanges and self.tests is None:
             raise ValueError("Must either set testChanges= or provide tests=")
 
-        if not self.pytestMode in RE_TEST_MODES:
-            raise ValueError("pytestMode must be one of: %s" % ", ".join(RE_TEST_MODES.keys()))
+        from bb_pytest import parsers
+        if self.pytestMode != "auto" and self.pytestMode not in parsers.PARSERS:
+            raise ValueError("pytestMode must be one of: %s" % ", ".join(
+                sorted(list(parsers.PARSERS) + ["auto"])))
 
         kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
         super(Pytest, self).__init__(**kwargs)
@@ -273,6 +447,11 @@ class Pytest(BuildStep, ShellMixin):
             command.extend(self.python)
         command.append(self.pytest)
         command.extend(self.pytestArgs)
+        if self.reduceLog:
+            command.extend(["-p", "bb_pytest.plugin",
+                            "--bb-ticks=%d" % self.tickInterval])
+            if self.fullLogDest:
+                command.append("--bb-full-log=%s" % self.fullLog)
         if self.verbose:
             command.append("-v")
 
@@ -283,6 +462,13 @@ class Pytest(BuildStep, ShellMixin):
         else:
             command.extend(self.tests)
 
+        if self.resourceInterval:
+            command = (self.python or ["python"]) + [
+                "-m", "bb_pytest.sampler",
+                "--interval=%s" % self.resourceInterval,
+                "--output=%s" % self.resourceFile,
+                "--"] + command
+
         self.command = command
 
         if self.testpath is not None:
@@ -297,6 +483,34 @@ class Pytest(BuildStep, ShellMixin):
 
         cmd = yield self.makeRemoteShellCommand(command=command)
 
+        self.resetResults()
+
+        if self.resourceInterval:
+            yield self.removeResourceFile()
+
+        yield self.runCommand(cmd)
+        self.observer.flushFailures()
+
+        if self.reduceLog and self.fullLogDest:
+            from buildbot.steps.transfer import FileUpload
+            self.build.addStepsAfterCurrentStep([
+                FileUpload(workersrc=self.fullLog, masterdest=self.fullLogDest,
+                           workdir=self.workdir, name="upload full pytest log",
+                           alwaysRun=True)])
+
+        if self.resourceInterval:
+            yield self.addResourceLogs()
+
+        self.descriptionDone = self.finalDescription(cmd)
+        self.updateSummary()
+
+        yield self.finishProblemLogs()
+
+        defer.returnValue(cmd.results())
+
+
+    def resetResults(self):
+        from bb_pytest import problems
         self.collected_results = {
             'total': 0,
             'failures': 0,
@@ -306,17 +520,104 @@ class Pytest(BuildStep, ShellMixin):
             'expectedFailures': 0,
             'unexpectedSuccesses': 0,
             }
-        self.catched_failures = []
+        self.failureGroups = problems.FailureGroups()
+        self._problemsLog = None
+        self._pendingLogs = []
 
-        yield self.runCommand(cmd)
 
-        self.descriptionDone = self.finalDescription(cmd)
-        self.updateSummary()
+    def problemLineReceived(self, line):
+        """
+        stream a line of the failures and errors sections to the problems log
+        """
+        if self._problemsLog is None:
+            self._problemsLog = self.addLog("problems")
 
-        if self.catched_failures:
-            self.addCompleteLog("problems", "\n".join(self.catched_failures))
+        def write(log):
+            d = log.addStdout(line + "\n")
+            d.addCallback(lambda _: log)
+            return d
+        self._problemsLog.addCallback(write)
 
-        defer.returnValue(cmd.results())
+
+    def failureReceived(self, summary, lines):
+        """
+        called by the observer with the L{bb_pytest.problems.FailureSummary}
+        and traceback of every failure. Only the first traceback of each
+        group of failures is kept, in a log of its own.
+        """
+        group, isNew = self.failureGroups.add(summary)
+        name = self.failureLogName(group)
+        if isNew and name is not None:
+            self._pendingLogs.append(
+                self.addCompleteLog(name, "\n".join(lines) + "\n"))
+
+
+    def failureLogName(self, group):
+        if group.number <= self.maxFailureLogs:
+            return "failure %d" % group.number
+        return None
+
+
+    @defer.inlineCallbacks
+    def finishProblemLogs(self):
+        if self._problemsLog is not None:
+            log = yield self._problemsLog
+            yield log.finish()
+        if self.failureGroups:
+            from bb_pytest import problems
+            self._pendingLogs.append(self.addCompleteLog(
+                "failures", problems.formatGroups(self.failureGroups,
+                                                  logName=self.failureLogName)))
+        yield defer.gatherResults(self._pendingLogs)
+
+
+    def removeResourceFile(self):
+        """
+        remove the report of an earlier build, so that it is not taken for
+        this one's if the sampler fails to start
+        """
+        from buildbot.process import remotecommand
+        # rmdir removes files too, and unlike rmfile every worker knows it
+        cmd = remotecommand.RemoteCommand('rmdir', {
+            'dir': self.build.path_module.join(self.workdir, self.resourceFile),
+            'logEnviron': self.logEnviron,
+            })
+        return self.runCommand(cmd)
+
+
+    @defer.inlineCallbacks
+    def addResourceLogs(self):
+        """
+        fetch the report of bb_pytest.sampler from the worker and add it as
+        logs, and the overall peak RSS as the pytest_peak_rss property
+        """
+        # build the transfer by hand, CompositeStepMixin would make every
+        # master.cfg import buildbot.steps.worker
+        from buildbot.process import remotecommand
+        from buildbot.process import remotetransfer
+        writer = remotetransfer.StringFileWriter()
+        args = {
+            'workdir': self.workdir,
+            'writer': writer,
+            'maxsize': None,
+            'blocksize': 32 * 1024,
+            }
+        if self.workerVersionIsOlderThan('uploadFile', '3.0'):
+            args['slavesrc'] = self.resourceFile
+        else:
+            args['workersrc'] = self.resourceFile
+        cmd = remotecommand.RemoteCommand('uploadFile', args)
+        yield self.runCommand(cmd)
+        if cmd.didFail() or not writer.buffer:
+            return
+        from bb_pytest import sampler
+        report = json.loads(writer.buffer)
+        yield self.addCompleteLog("resources", sampler.formatSamples(report))
+        if report["peaks"]:
+            yield self.addCompleteLog("peak memory", sampler.formatPeaks(report))
+        if report["samples"]:
+            peak = max(sample[2] for sample in report["samples"])
+            self.setProperty("pytest_peak_rss", peak, "Pytest")
 
 
     def finalDescription(self, cmd):
@@ -0,0 +1,125 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import subprocess
+import sys
+import unittest
+
+from twisted.python import log
+from twisted.trial.unittest import TestCase
+
+
+# the modules bb_pytest.step cannot do without, importing it on top of
+# them must load nothing but bb_pytest's own
+BASELINE_MODULES = [
+    'twisted.internet.defer',
+    'twisted.python.log',
+    'buildbot.process.results',
+    'buildbot.process.logobserver',
+    'buildbot.process.buildstep',
+    ]
+OWN_MODULES = [
+    'bb_pytest',
+    'bb_pytest.step',
+    ]
+
+# master.cfg imports bb_pytest.step on every reconfig, keep what it adds to
+# BASELINE_MODULES under this.  About 4ms is measured, the margin is there
+# for busy and slow machines, this catches a heavy import sneaking back in.
+IMPORT_BUDGET_US = 100000
+
+# modules which must only be loaded once a step that needs them is built
+LAZY_MODULES = [
+    'future',
+    'future.builtins',
+    'bb_pytest.parsers',
+    'bb_pytest.plugin',
+    'bb_pytest.sampler',
+    'bb_pytest.replay',
+    'bb_pytest.problems',
+    'buildbot.steps.worker',
+    'buildbot.process.remotetransfer',
+    ]
+
+
+def importTimes(module):
+    """
+    Import C{module} in a fresh interpreter and return a dict mapping
+    every module it loaded to its (self, cumulative) import time in
+    microseconds.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise AssertionError("importing %s failed:\n%s" % (module, stderr))
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def importStep():
+    """
+    Import bb_pytest.step in a fresh interpreter which already loaded
+    BASELINE_MODULES.
+
+    @return: the names of the modules it loaded beyond those, and its
+             cumulative import time in microseconds.
+    """
+    script = ("import sys; import %s; before = set(sys.modules); "
+              "import bb_pytest.step; "
+              "print(' '.join(sorted(set(sys.modules) - before)))"
+              % ", ".join(BASELINE_MODULES))
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise AssertionError("importing bb_pytest.step failed:\n%s" % stderr)
+    cumulative = None
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and line.endswith('| bb_pytest.step'):
+            cumulative = int(line.split('|')[1])
+    if cumulative is None:
+        raise AssertionError("no import time of bb_pytest.step in:\n%s" % stderr)
+    return stdout.split(), cumulative
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs python 3.7")
+class TestImportCost(TestCase):
+
+    def test_lazy_modules_not_loaded(self):
+        times = importTimes('bb_pytest.step')
+        self.assertIn('bb_pytest.step', times)
+        for module in LAZY_MODULES:
+            self.assertFalse(module in times, "%s was imported" % module)
+
+    def test_no_new_modules(self):
+        modules, _ = importStep()
+        self.assertEqual(modules, OWN_MODULES)
+
+    def test_import_budget(self):
+        _, cumulative = importStep()
+        log.msg("bb_pytest.step took %dus to import" % cumulative)
+        self.assertTrue(cumulative < IMPORT_BUDGET_US,
+                        "bb_pytest.step took %dus to import" % cumulative)
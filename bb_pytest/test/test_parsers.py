@@ -0,0 +1,193 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from os.path import abspath, dirname
+
+from twisted.trial.unittest import TestCase
+
+from bb_pytest import parsers
+
+
+MODULE_DIR = abspath(dirname(__file__))
+
+
+def feedLines(parser, output):
+    for line in output.splitlines():
+        parser.feed(line)
+    return parser.result
+
+
+class TestPytestParser(TestCase):
+
+    def test_verbose(self):
+        result = feedLines(parsers.get_parser("pytest"), """\
+fixture.py::test_test1 PASSED                                            [ 11%]
+fixture.py::test_failure1 FAILED                                         [ 22%]
+fixture.py::test_skipped1 SKIPPED (unconditional skip)                   [ 33%]
+fixture.py::test_xfail XFAIL (bug)                                       [ 44%]
+------------------------------- Captured stderr --------------------------------
+""")
+        self.assertEqual(result.numTests, 4)
+        self.assertEqual(result.lastTest, "fixture.py::test_xfail")
+        self.assertEqual(result.outcomes, {"passed": 1, "failed": 1, "skipped": 1,
+                                           "xfailed": 1})
+        self.assertEqual(result.percent, 44)
+
+    def test_old_verbose(self):
+        result = feedLines(parsers.get_parser("pytest"), """\
+fixture.py:4: test_test1 PASSED
+fixture.py:8: test_failure1 FAILED
+fixture.py:17: test_skipped1 SKIPPED
+""")
+        self.assertEqual(result.numTests, 3)
+        self.assertEqual(result.lastTest, "test_skipped1")
+
+
+class TestDotsParser(TestCase):
+
+    def test_dots(self):
+        result = feedLines(parsers.get_parser("dots"), """\
+../bb_pytest/test/fixture.py .F.s.s.FF
+""")
+        self.assertEqual(result.numTests, 9)
+        self.assertEqual(result.lastTest, "../bb_pytest/test/fixture.py")
+        self.assertEqual(result.outcomes, {"passed": 4, "failed": 3, "skipped": 2})
+        self.assertEqual(result.percent, None)
+
+    def test_wrapped_with_progress(self):
+        result = feedLines(parsers.get_parser("dots"), """\
+test_a.py ....................................................           [ 52%]
+..............................................                           [ 98%]
+test_b.py .F                                                             [100%]
+""")
+        self.assertEqual(result.numTests, 100)
+        self.assertEqual(result.outcomes, {"passed": 99, "failed": 1})
+        self.assertEqual(result.percent, 100)
+
+    def test_all_outcomes(self):
+        result = feedLines(parsers.get_parser("dots"), """\
+test_a.py .FEsxX                                                         [ 60%]
+""")
+        self.assertEqual(result.outcomes, {"passed": 1, "failed": 1, "error": 1,
+                                           "skipped": 1, "xfailed": 1, "xpassed": 1})
+        self.assertEqual(result.percent, 60)
+
+    def test_fixture(self):
+        parser = parsers.get_parser("dots")
+        with open(MODULE_DIR + "/fixture.stdout") as f:
+            parser.feed_chunk(f.read())
+        self.assertEqual(parser.result.numTests, 9)
+
+
+class TestXdistParser(TestCase):
+
+    def test_verbose(self):
+        result = feedLines(parsers.get_parser("xdist"), """\
+[gw1] [ 10%] PASSED fixture.py::test_test1
+[gw0] [ 20%] FAILED fixture.py::test_failure1
+[gw1] PASSED fixture.py:4: test_test2
+""")
+        self.assertEqual(result.numTests, 3)
+        self.assertEqual(result.lastTest, "fixture.py:4: test_test2")
+        self.assertEqual(result.outcomes, {"passed": 2, "failed": 1})
+        self.assertEqual(result.percent, 20)
+
+    def test_quiet(self):
+        result = feedLines(parsers.get_parser("xdist"), """\
+.F.s.s.FF                                                                [100%]
+""")
+        self.assertEqual(result.numTests, 9)
+
+
+class TestSummaryParser(TestCase):
+
+    def test_summary(self):
+        result = feedLines(parsers.get_parser("summary"), """\
+PASSED fixture.py::test_test1
+FAILED fixture.py::test_failure1 - assert False
+SKIPPED [2] fixture.py:18: unconditional skip
+XFAIL fixture.py::test_xpass
+  reason: bug
+""")
+        self.assertEqual(result.numTests, 5)
+        self.assertEqual(result.outcomes, {"passed": 1, "failed": 1,
+                                           "skipped": 2, "xfailed": 1})
+
+
+class TestSugarParser(TestCase):
+
+    def test_redraws(self):
+        result = feedLines(parsers.get_parser("sugar"), (
+            " fixture.py ✓\r fixture.py ✓⨯     22% ██\n"
+            " fixture.py ✓⨯✓s            44% ████\n"
+            " other.py \x1b[32m✓\x1b[0m             55% █████\n"))
+        self.assertEqual(result.numTests, 5)
+        self.assertEqual(result.lastTest, "other.py")
+        self.assertEqual(result.outcomes, {"passed": 3, "failed": 1, "skipped": 1})
+        self.assertEqual(result.percent, 55)
+
+
+class TestTicksParser(TestCase):
+
+    def test_ticks(self):
+        result = feedLines(parsers.get_parser("ticks"), """\
+fixture.py F
+##bb-pytest tick passed=1 failed=1 skipped=0 error=0 xfailed=0 xpassed=0
+fixture.py s
+##bb-pytest tick passed=3 failed=1 skipped=1 error=0 xfailed=0 xpassed=0
+""")
+        self.assertEqual(result.numTests, 5)
+        self.assertEqual(result.outcomes["passed"], 3)
+
+
+class TestRegistry(TestCase):
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, parsers.get_parser, "nosuchmode")
+
+    def test_detect(self):
+        self.assertEqual(parsers.detect_parser(["collected 9 items"]), "dots")
+        self.assertEqual(parsers.detect_parser(["collecting ... collected 9 items"]), "pytest")
+        self.assertEqual(parsers.detect_parser(["gw0 I / gw1 I", "gw0 [9] / gw1 [9]"]), "xdist")
+        self.assertEqual(parsers.detect_parser(["2 workers [9 items]"]), "xdist")
+        self.assertEqual(parsers.detect_parser(["plugins: sugar-0.9.4, xdist-2.1.0",
+                                                "collected 9 items"]), "sugar")
+        self.assertEqual(parsers.detect_parser(["bb-pytest: ticks every 100 tests",
+                                                "collected 9 items"]), "ticks")
+        self.assertEqual(parsers.detect_parser([]), "pytest")
+
+    def test_register(self):
+
+        class TapParser(parsers.OutputParser):
+            name = "tap"
+
+            @classmethod
+            def detect(cls, header):
+                return "TAP version 13" in header
+
+            def feed(self, line):
+                if line.startswith("ok "):
+                    self.result.addTest("passed", line[3:])
+
+        self.addCleanup(parsers.PARSERS.pop, "tap")
+        self.addCleanup(parsers._detectOrder.remove, "tap")
+        parsers.register_parser("tap", TapParser)
+        self.assertEqual(parsers.detect_parser(["TAP version 13", "collected 1 items"]), "tap")
+        parser = parsers.get_parser("tap")
+        parser.feed_chunk("ok 1 - te")
+        self.assertEqual(parser.result.numTests, 0)
+        parser.feed_chunk("st_one\n")
+        self.assertEqual(parser.result.numTests, 1)
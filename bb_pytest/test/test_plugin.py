@@ -0,0 +1,78 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from os.path import abspath, dirname
+
+from twisted.trial.unittest import TestCase
+
+from bb_pytest import parsers
+
+
+MODULE_DIR = abspath(dirname(__file__))
+FIXTURE_PATH = MODULE_DIR + "/fixture.py"
+
+
+def runPytest(*args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = dirname(dirname(MODULE_DIR))
+    pytest = subprocess.Popen(
+        [sys.executable, '-m', 'pytest', '-p', 'no:cacheprovider',
+         '-p', 'bb_pytest.plugin', FIXTURE_PATH] + list(args),
+        stdout=subprocess.PIPE, env=env, universal_newlines=True)
+    return pytest.communicate()[0]
+
+
+class TestPlugin(TestCase):
+
+    def tempDir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+    def test_ticks(self):
+        stdout = runPytest('--bb-ticks=5')
+        self.assertIn("bb-pytest: ticks every 5 tests", stdout)
+        ticks = [line for line in stdout.splitlines()
+                 if line.startswith("##bb-pytest tick ")]
+        self.assertEqual(ticks, [
+            "##bb-pytest tick passed=3 failed=1 skipped=1 error=0 xfailed=0 xpassed=0",
+            "##bb-pytest tick passed=4 failed=3 skipped=2 error=0 xfailed=1 xpassed=0",
+            "##bb-pytest tick passed=5 failed=3 skipped=2 error=0 xfailed=1 xpassed=1",
+            ])
+        # passing tests are not shown, failures are
+        marks = "".join(line.split()[1] for line in stdout.splitlines()
+                        if line.split(" ", 1)[0].endswith("fixture.py"))
+        self.assertEqual(marks, "FssFFxX")
+        self.assertIn("test_failure1", stdout)
+
+        parser = parsers.get_parser("ticks")
+        parser.feed_chunk(stdout)
+        self.assertEqual(parser.result.numTests, 12)
+
+    def test_full_log(self):
+        path = os.path.join(self.tempDir(), "full.log.gz")
+        runPytest('--bb-ticks=100', '--bb-full-log=%s' % path)
+        with gzip.open(path, "rt") as f:
+            fullLog = f.read()
+        self.assertIn("fixture.py::test_test1 PASSED\n", fullLog)
+        self.assertIn("fixture.py::test_xpass XFAILED\n", fullLog)
+        self.assertIn("fixture.py:10: AssertionError", fullLog)
@@ -0,0 +1,151 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from os.path import abspath, dirname
+
+from twisted.trial.unittest import TestCase
+
+from bb_pytest import problems
+
+
+MODULE_DIR = abspath(dirname(__file__))
+
+SHORT_FAILURES = """\
+=================================== FAILURES ===================================
+_________________________________ test_many[0] _________________________________
+t_many.py:6: in test_many
+    helper(x)
+t_many.py:3: in helper
+    assert x < 0
+E   assert 0 < 0
+_________________________________ test_other ___________________________________
+t_many.py:8: in test_other
+    raise ValueError("boom")
+E   ValueError: boom
+=========================== short test summary info ============================
+"""
+
+# pytest -rA, the record of PASSES is not a failure
+REPORT_ALL = """\
+==================================== ERRORS ====================================
+_________________________ ERROR at setup of test_setup _________________________
+
+    @pytest.fixture
+    def broken():
+>       raise RuntimeError("no database")
+E       RuntimeError: no database
+
+t_err.py:5: RuntimeError
+=================================== FAILURES ===================================
+__________________________________ test_fails __________________________________
+
+    def test_fails():
+>       assert 0
+E       assert 0
+
+t_err.py:11: AssertionError
+==================================== PASSES ====================================
+_________________________________ test_passes __________________________________
+----------------------------- Captured stdout call -----------------------------
+hello
+=========================== short test summary info ============================
+"""
+
+
+def split(output):
+    splitter = problems.FailureSplitter()
+    records = []
+    for line in output.splitlines():
+        record = splitter.feed(line)
+        if record is not None:
+            records.append(record)
+    record = splitter.close()
+    if record is not None:
+        records.append(record)
+    return records
+
+
+class TestFailureSplitter(TestCase):
+
+    def test_fixture(self):
+        with open(MODULE_DIR + "/fixture.problems") as f:
+            records = split(f.read())
+        self.assertEqual(
+            [(s.testname, s.exception, s.location) for s, _ in records],
+            [("test_failure1", "AssertionError", "../bb_pytest/test/fixture.py:9"),
+             ("test_failure2", "AssertionError", "../bb_pytest/test/fixture.py:33"),
+             ("test_failure3", "AssertionError", "../bb_pytest/test/fixture.py:37")])
+        summary, lines = records[0]
+        self.assertEqual(summary.signature, "../bb_pytest/test/fixture.py:9: AssertionError")
+        self.assertEqual(lines[0].strip("_ "), "test_failure1")
+        self.assertEqual(lines[-1], "../bb_pytest/test/fixture.py:9: AssertionError")
+
+    def test_short_traceback(self):
+        records = split(SHORT_FAILURES)
+        self.assertEqual(
+            [(s.testname, s.exception, s.location) for s, _ in records],
+            [("test_many[0]", None, "t_many.py:3"),
+             ("test_other", "ValueError", "t_many.py:8")])
+
+    def test_no_location(self):
+        records = split("==== FAILURES ====\n____ test_x ____\nsomething went wrong\n")
+        self.assertEqual(records[0][0].signature, "test_x")
+
+    def test_report_all(self):
+        records = split(REPORT_ALL)
+        self.assertEqual(
+            [(s.testname, s.exception, s.location) for s, _ in records],
+            [("test_setup", "RuntimeError", "t_err.py:5"),
+             ("test_fails", "AssertionError", "t_err.py:11")])
+        self.assertEqual(records[1][1][-1], "t_err.py:11: AssertionError")
+
+    def test_outside_sections(self):
+        self.assertEqual(split("____ test_x ____\nsomething went wrong\n"), [])
+
+
+class TestFailureGroups(TestCase):
+
+    def setUp(self):
+        self.groups = problems.FailureGroups()
+        for i in range(12):
+            self.groups.add(problems.FailureSummary(
+                "test_many[%d]" % i, "AssertionError", "t_many.py:3"))
+        self.groups.add(problems.FailureSummary("test_other", "ValueError", "t_many.py:8"))
+
+    def test_add(self):
+        group, isNew = self.groups.add(
+            problems.FailureSummary("test_again", "ValueError", "t_many.py:8"))
+        self.assertFalse(isNew)
+        self.assertEqual(group.number, 2)
+        self.assertEqual(group.testnames, ["test_other", "test_again"])
+        self.assertEqual(len(self.groups), 2)
+        self.assertEqual(self.groups.numFailures, 14)
+
+    def test_format(self):
+        text = problems.formatGroups(
+            self.groups, maxNames=2,
+            logName=lambda group: "failure %d" % group.number if group.number == 1 else None)
+        self.assertEqual(text, """\
+13 failures in 2 groups
+
+12 x t_many.py:3: AssertionError (log: failure 1)
+    test_many[0]
+    test_many[1]
+    ... and 10 more
+
+1 x t_many.py:8: ValueError
+    test_other
+""")
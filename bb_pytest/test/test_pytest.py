@@ -27,12 +27,23 @@ from buildbot.test.util.steps import BuildStepMixin
 from buildbot.process.results import FAILURE
 from buildbot.process.results import SUCCESS
 from buildbot.process.results import WARNINGS
+from buildbot.test.fake.remotecommand import Expect
+from buildbot.test.fake.remotecommand import ExpectRemoteRef
 from buildbot.test.fake.remotecommand import ExpectShell
+from buildbot.process import remotetransfer
 from buildbot.process.properties import Property
 
 from bb_pytest.step import Pytest
 
 
+def uploadString(string):
+    def behavior(command):
+        writer = command.args['writer']
+        writer.remote_write(string)
+        writer.remote_close()
+    return behavior
+
+
 class TestPytest(BuildStepMixin, TestCase, TestReactorMixin):
 
     def setUp(self):
@@ -264,6 +275,114 @@ collecting ... collected 11 items
         self.expectOutcome(result=FAILURE, state_string='total 11 tests 1 failed 3 errors 1 deselected 6 passed (failure)')
         return self.runStep()
 
+    def test_non_verbose_uses_dots(self):
+        step = Pytest(tests='testname', testpath=None, verbose=False)
+        self.assertEqual(step.pytestMode, 'dots')
+
+    def test_run_reduce_log(self):
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   reduceLog=True,
+                   tickInterval=2,
+                   testpath=None))
+        self.expectCommands(
+            ExpectShell(workdir='build',
+                        command=[Pytest.DEFAULT_PYTEST, '-p', 'bb_pytest.plugin',
+                                 '--bb-ticks=2', 'testname'])
+            + ExpectShell.log('stdio', stdout="""bb-pytest: ticks every 2 tests
+collected 3 items
+
+fixture.py F
+##bb-pytest tick passed=1 failed=1 skipped=0 error=0 xfailed=0 xpassed=0
+##bb-pytest tick passed=2 failed=1 skipped=0 error=0 xfailed=0 xpassed=0
+==== 1 failed, 2 passed in 0.10 seconds ====
+""")
+            + 1)
+        self.expectOutcome(result=FAILURE, state_string='total 3 tests 1 failed 2 passed (failure)')
+        return self.runStep()
+
+    def test_run_resources(self):
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   resourceInterval=0.5,
+                   testpath=None))
+        report = ('{"interval":0.5,"samples":[[0.0,0.0,5000,0,0,null],'
+                  '[0.5,98.5,90000,4096,0,"fixture.py::test_test1"]],'
+                  '"peaks":{"fixture.py::test_test1":90000}}')
+        self.expectCommands(
+            Expect('rmdir', dict(dir='build/pytest-resources.json', logEnviron=True))
+            + 0,
+            ExpectShell(workdir='build',
+                        command=['python', '-m', 'bb_pytest.sampler', '--interval=0.5',
+                                 '--output=pytest-resources.json', '--',
+                                 Pytest.DEFAULT_PYTEST, '-v', 'testname'])
+            + ExpectShell.log('stdio', stdout="collecting ... collected 0 items\n")
+            + 0,
+            Expect('uploadFile', dict(workersrc='pytest-resources.json', workdir='build',
+                                      writer=ExpectRemoteRef(remotetransfer.StringFileWriter),
+                                      maxsize=None, blocksize=32 * 1024))
+            + Expect.behavior(uploadString(report))
+            + 0)
+        self.expectOutcome(result=SUCCESS, state_string='no tests run')
+        self.expectLogfile('peak memory', "     90000 KiB  fixture.py::test_test1\n")
+        self.expectProperty('pytest_peak_rss', 90000, 'Pytest')
+        return self.runStep()
+
+    def test_run_resources_no_report(self):
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   python='python3',
+                   resourceInterval=0.5,
+                   testpath=None))
+        self.expectCommands(
+            Expect('rmdir', dict(dir='build/pytest-resources.json', logEnviron=True))
+            + 0,
+            ExpectShell(workdir='build',
+                        command=['python3', '-m', 'bb_pytest.sampler', '--interval=0.5',
+                                 '--output=pytest-resources.json', '--',
+                                 'python3', Pytest.DEFAULT_PYTEST, '-v', 'testname'])
+            + ExpectShell.log('stdio', stderr="No module named bb_pytest.sampler\n")
+            + 1,
+            Expect('uploadFile', dict(workersrc='pytest-resources.json', workdir='build',
+                                      writer=ExpectRemoteRef(remotetransfer.StringFileWriter),
+                                      maxsize=None, blocksize=32 * 1024))
+            + 1)
+        self.expectOutcome(result=FAILURE, state_string='no tests run (failure)')
+        self.expectNoProperty('pytest_peak_rss')
+        return self.runStep()
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, Pytest, tests='testname', testpath=None,
+                          pytestMode='nosuchmode')
+
+    def test_run_auto_xdist(self):
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   pytestMode='auto',
+                   testpath=None))
+        self.expectCommands(
+            ExpectShell(workdir='build',
+                        command=[Pytest.DEFAULT_PYTEST, '-v', 'testname'])
+            + ExpectShell.log('stdio', stdout="""============================= test session starts ==============================
+plugins: xdist-2.1.0
+gw0 I / gw1 I
+gw0 [2] / gw1 [2]
+
+scheduling tests via LoadScheduling
+
+[gw0] [ 50%] PASSED fixture.py::test_test1
+[gw1] [100%] PASSED fixture.py::test_test2
+
+==== 2 passed in 0.10 seconds ====
+""")
+            + 0)
+        self.expectOutcome(result=SUCCESS, state_string='total 2 tests passed')
+        return self.runStep()
+
 
 MODULE_DIR = abspath(dirname(__file__))
 FIXTURE_PATH = MODULE_DIR + "/fixture.py"
@@ -286,6 +405,65 @@ class TestPytestIntegration(BuildStepMixin, TestCase, TestReactorMixin):
     def tearDown(self):
         return self.tearDownBuildStep()
 
+    def test_pytest8_xdist(self):
+        with open(MODULE_DIR + "/fixture_pytest8_xdist.stdout") as f:
+            pytest_stdout = f.read()
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   pytestMode='auto',
+                   testpath=None))
+        self.expectCommands(
+            ExpectShell(workdir='build',
+                        command=[Pytest.DEFAULT_PYTEST, '-v', 'testname'])
+            + ExpectShell.log('stdio', stdout=pytest_stdout)
+            + 1)
+        self.expectOutcome(result=FAILURE, state_string='total 12 tests 3 failed 2 skiped 1 todo 1 surprises 5 passed (failure)')
+        self.expectLogfile('failures', """\
+3 failures in 3 groups
+
+1 x fixture.py:10: AssertionError (log: failure 1)
+    test_failure1
+
+1 x fixture.py:37: AssertionError (log: failure 2)
+    test_failure2
+
+1 x fixture.py:42: AssertionError (log: failure 3)
+    test_failure3
+""")
+        d = self.runStep()
+        d.addCallback(lambda _: self.assertEqual(self.step.observer.numTests, 12))
+        return d
+
+    def test_pytest8_quiet(self):
+        with open(MODULE_DIR + "/fixture_pytest8_quiet.stdout") as f:
+            pytest_stdout = f.read()
+        self.setupStep(
+            Pytest(workdir='build',
+                   tests='testname',
+                   verbose=False,
+                   pytestArgs=['-q'],
+                   testpath=None))
+        self.expectCommands(
+            ExpectShell(workdir='build',
+                        command=[Pytest.DEFAULT_PYTEST, '-q', 'testname'])
+            + ExpectShell.log('stdio', stdout=pytest_stdout)
+            + 1)
+        self.expectOutcome(result=FAILURE, state_string='total 12 tests 3 failed 2 skiped 1 todo 1 surprises 5 passed (failure)')
+        self.expectLogfile('failures', """\
+3 failures in 3 groups
+
+1 x fixture.py:10: AssertionError (log: failure 1)
+    test_failure1
+
+1 x fixture.py:37: AssertionError (log: failure 2)
+    test_failure2
+
+1 x fixture.py:42: AssertionError (log: failure 3)
+    test_failure3
+""")
+        return self.runStep()
+
     def test_pytest_problems_1(self):
         pytest_stdout = open(MODULE_DIR + "/fixture.stdout").read()
         pytest_problems = open(MODULE_DIR + "/fixture.problems").read()
@@ -301,6 +479,27 @@ class TestPytestIntegration(BuildStepMixin, TestCase, TestReactorMixin):
             + 1)
         self.expectOutcome(result=FAILURE, state_string='total 9 tests 3 failed 2 skiped 4 passed (failure)')
         #self.expectLogfile(logfile='problems', contents=pytest_problems)
+        self.expectLogfile('failures', """\
+3 failures in 3 groups
+
+1 x ../bb_pytest/test/fixture.py:9: AssertionError (log: failure 1)
+    test_failure1
+
+1 x ../bb_pytest/test/fixture.py:33: AssertionError (log: failure 2)
+    test_failure2
+
+1 x ../bb_pytest/test/fixture.py:37: AssertionError (log: failure 3)
+    test_failure3
+""")
+        self.expectLogfile('failure 3', """\
+________________________________ test_failure3 _________________________________
+
+    def test_failure3():
+>       assert False
+E       assert False
+
+../bb_pytest/test/fixture.py:37: AssertionError
+""")
 
         return self.runStep()
 
@@ -0,0 +1,130 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from io import StringIO
+from os.path import abspath, dirname
+
+from twisted.trial.unittest import TestCase
+
+from bb_pytest import replay
+
+
+MODULE_DIR = abspath(dirname(__file__))
+
+
+class TestReplay(TestCase):
+
+    def tempDir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+    def test_non_verbose(self):
+        outcome = replay.replayLog(MODULE_DIR + "/fixture.stdout")
+        self.assertEqual(outcome["description"], "total 9 tests 3 failed 2 skiped 4 passed")
+        self.assertEqual(outcome["mode"], "dots")
+        self.assertEqual(outcome["numTests"], 9)
+        self.assertEqual(outcome["outcomes"], {"passed": 4, "failed": 3, "skipped": 2})
+        # no exit code in the log, guessed from the failures
+        self.assertEqual(outcome["rc"], 1)
+        self.assertEqual(outcome["result"], "failure")
+        self.assertEqual([(group["signature"], group["tests"])
+                          for group in outcome["failureGroups"]],
+                         [("../bb_pytest/test/fixture.py:9: AssertionError", ["test_failure1"]),
+                          ("../bb_pytest/test/fixture.py:33: AssertionError", ["test_failure2"]),
+                          ("../bb_pytest/test/fixture.py:37: AssertionError", ["test_failure3"])])
+
+    def test_verbose(self):
+        outcome = replay.replayLog(MODULE_DIR + "/fixture_failures.stdout")
+        self.assertEqual(outcome["description"], "total 53 tests 37 failed 16 passed")
+        self.assertEqual(outcome["mode"], "pytest")
+        self.assertTrue(outcome["finished"])
+
+    def test_pytest8(self):
+        outcome = replay.replayLog(MODULE_DIR + "/fixture_pytest8.stdout")
+        self.assertTrue(outcome["finished"])
+        self.assertEqual(outcome["description"],
+                         "total 12 tests 3 failed 2 skiped 1 todo 1 surprises 5 passed")
+        self.assertEqual(outcome["result"], "failure")
+        self.assertEqual(outcome["results"]["warnings"], 7)
+        self.assertEqual(len(outcome["failureGroups"]), 3)
+
+    def test_unfinished(self):
+        path = os.path.join(self.tempDir(), "stdio.log")
+        with open(path, "w") as f:
+            f.write("collecting ... collected 5 items\n\n"
+                    "fixture.py::test_test1 PASSED                 [ 20%]\n"
+                    "fixture.py::test_failure1 FAILED              [ 40%]\n")
+        outcome = replay.replayLog(path)
+        self.assertFalse(outcome["finished"])
+        self.assertEqual(outcome["lastTest"], "fixture.py::test_failure1")
+        self.assertEqual(outcome["percent"], 40)
+        # no results line, guessed from the failure seen
+        self.assertEqual(outcome["rc"], 1)
+        self.assertEqual(outcome["result"], "failure")
+
+    def test_progress_description(self):
+        step = replay.ReplayedPytest(tests=[], testpath=None, verbose=False)
+        step.resetResults()
+        step.observer.setStep(step)
+        for line in ["collected 4 items", "", "fixture.py .FE"]:
+            step.observer.outLineReceived(line)
+        self.assertEqual(step.description,
+                         ["testing", "3", "of", "4", "tests", "1 failed", "1 error"])
+
+    def test_exit_code(self):
+        path = os.path.join(self.tempDir(), "stdio.log")
+        with gzip.open(path + ".gz", "wt") as f:
+            f.write("collected 2 items\n\n"
+                    "fixture.py ..\n\n"
+                    "==== 2 passed in 0.01 seconds ====\n"
+                    "program finished with exit code 5\n"
+                    "elapsedTime=0.5\n")
+        outcome = replay.replayLog(path + ".gz", rc=0)
+        self.assertEqual(outcome["rc"], 5)
+        self.assertEqual(outcome["result"], "failure")
+        self.assertEqual(outcome["description"], "total 2 tests passed")
+
+    def _main(self, *argv):
+        stdout = StringIO()
+        self.patch(sys, "stdout", stdout)
+        rc = replay.main(list(argv))
+        return rc, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_main_directory(self):
+        logs = self.tempDir()
+        os.makedirs(os.path.join(logs, "build-2"))
+        shutil.copy(MODULE_DIR + "/fixture.stdout", os.path.join(logs, "stdio-1.log"))
+        shutil.copy(MODULE_DIR + "/fixture_failures.stdout",
+                    os.path.join(logs, "build-2", "stdio-2.log"))
+        shutil.copy(MODULE_DIR + "/fixture.py", os.path.join(logs, "fixture.py"))
+        rc, outcomes = self._main(logs, "--pattern=*.log", "--jobs=2")
+        self.assertEqual(rc, 0)
+        self.assertEqual([outcome["log"] for outcome in outcomes],
+                         [os.path.join(logs, "stdio-1.log"),
+                          os.path.join(logs, "build-2", "stdio-2.log")])
+        self.assertEqual([outcome["results"]["total"] for outcome in outcomes], [9, 53])
+
+    def test_main_missing(self):
+        rc, outcomes = self._main(MODULE_DIR + "/nosuchlog")
+        self.assertEqual(rc, 1)
+        self.assertIn("error", outcomes[0])
@@ -0,0 +1,177 @@
+# Pytest support for Buildbot.
+# Copyright (C) 2012 Russell Sim
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname
+
+from twisted.trial.unittest import TestCase
+
+from bb_pytest import sampler
+
+
+MODULE_DIR = abspath(dirname(__file__))
+
+# seconds FAKE_PYTEST waits to be released before it gives up
+RELEASE_TIMEOUT = 60
+
+# prints like pytest -v and holds on to 50MiB in the first test until
+# told to go on through the fifo given as its argument
+FAKE_PYTEST = """
+import signal, sys
+signal.alarm(%d)
+sys.stdout.write("fixture.py::test_big ")
+sys.stdout.flush()
+data = bytearray(50 * 1024 * 1024)
+with open(sys.argv[1]) as fifo:
+    fifo.read()
+print("PASSED")
+del data
+sys.stdout.write("fixture.py::test_small ")
+sys.stdout.flush()
+print("FAILED")
+sys.exit(1)
+""" % RELEASE_TIMEOUT
+
+
+class ReleasingSampler(sampler.Sampler):
+    """
+    Lets FAKE_PYTEST go on once a sample of test_big holding its memory
+    was taken, however long that takes up to RELEASE_TIMEOUT.
+    """
+
+    def __init__(self, command, interval, fifo):
+        sampler.Sampler.__init__(self, command, interval, output=io.BytesIO())
+        self.fifo = fifo
+        self.released = False
+
+    def sample(self, pid, start, last):
+        last = sampler.Sampler.sample(self, pid, start, last)
+        if not self.released and self.peaks.get("fixture.py::test_big", 0) > 50 * 1024:
+            try:
+                # FAKE_PYTEST may not be reading yet, try again next time
+                # rather than block
+                fd = os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                return last
+            os.write(fd, b"go\n")
+            os.close(fd)
+            self.released = True
+        return last
+
+
+REPORT = {
+    "interval": 1.0,
+    "columns": sampler.COLUMNS,
+    "samples": [
+        [0.0, 0.0, 5000, 0, 0, None],
+        [1.0, 98.5, 90000, 4096, 0, "fixture.py::test_big"],
+        [2.0, 50.0, 8000, 4096, 8192, "fixture.py::test_small"],
+        ],
+    "peaks": {
+        "fixture.py::test_small": 8000,
+        "fixture.py::test_big": 90000,
+        },
+    }
+
+
+class TestTestTracker(TestCase):
+
+    def test_verbose(self):
+        tracker = sampler.TestTracker()
+        tracker.feed_chunk("collecting ... collected 2 items\n\nfixture.py::test_test1 ")
+        self.assertEqual(tracker.current(), "fixture.py::test_test1")
+        tracker.feed_chunk("PASSED\n")
+        self.assertEqual(tracker.current(), None)
+
+    def test_dots(self):
+        tracker = sampler.TestTracker()
+        tracker.feed_chunk("collected 9 items\n\nfixture.py .F.")
+        self.assertEqual(tracker.current(), "fixture.py")
+
+    def test_xdist(self):
+        tracker = sampler.TestTracker()
+        tracker.feed_chunk("[gw0] [ 50%] PASSED fixture.py::test_test1\n")
+        self.assertEqual(tracker.current(), "fixture.py::test_test1")
+
+    def test_xdist_failures(self):
+        tracker = sampler.TestTracker()
+        tracker.feed_chunk("[gw1] [100%] FAILED fixture.py::test_failure1\n"
+                           "\n=================================== FAILURES ===================================\n"
+                           "[gw1] linux -- Python 3.8.18 /usr/bin/python\n")
+        self.assertEqual(tracker.current(), "fixture.py::test_failure1")
+
+
+class TestFormat(TestCase):
+
+    def test_samples(self):
+        lines = sampler.formatSamples(REPORT).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[2].split(), ["1.0", "98.5", "90000", "4096", "0",
+                                            "fixture.py::test_big"])
+
+    def test_peaks(self):
+        self.assertEqual(sampler.formatPeaks(REPORT, limit=1),
+                         "     90000 KiB  fixture.py::test_big\n")
+
+
+@unittest.skipIf(not os.path.exists("/proc/self/stat"), "needs /proc")
+class TestSampler(TestCase):
+
+    def test_sample_tree(self):
+        cpu, rss, _, _ = sampler.sampleTree(os.getpid())
+        self.assertTrue(cpu > 0)
+        self.assertTrue(rss > 0)
+
+    def tempDir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+    def test_run(self):
+        fifo = os.path.join(self.tempDir(), "release")
+        os.mkfifo(fifo)
+        sampling = ReleasingSampler([sys.executable, '-c', FAKE_PYTEST, fifo], 0.05, fifo)
+        # killed by SIGALRM if it was never released
+        self.assertEqual(sampling.run(), 1)
+        self.assertEqual(sampling.output.getvalue(), b"fixture.py::test_big PASSED\n"
+                                                     b"fixture.py::test_small FAILED\n")
+        self.assertTrue(sampling.released)
+        peaks = sampling.report()["peaks"]
+        self.assertTrue(peaks["fixture.py::test_big"] > 50 * 1024)
+
+    def test_main(self):
+        output = os.path.join(self.tempDir(), "report.json")
+        env = dict(os.environ)
+        env['PYTHONPATH'] = dirname(dirname(MODULE_DIR))
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'bb_pytest.sampler', '--interval=0.1',
+             '--output=%s' % output, '--', sys.executable, '-c',
+             'print("fixture.py::test_test1 PASSED"); raise SystemExit(1)'],
+            stdout=subprocess.PIPE, env=env, universal_newlines=True)
+        stdout = proc.communicate()[0]
+        self.assertEqual(proc.returncode, 1)
+        self.assertEqual(stdout, "fixture.py::test_test1 PASSED\n")
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(report["columns"], sampler.COLUMNS)
+        self.assertEqual(report["interval"], 0.1)
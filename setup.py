@@ -34,5 +34,7 @@ setup(name='bb-pytest',
       ],
       entry_points="""
       # -*- Entry points: -*-
+      [console_scripts]
+      bb-pytest-replay = bb_pytest.replay:main
       """,
       )